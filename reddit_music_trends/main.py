@@ -8,6 +8,7 @@ from modules.sentiment_analysis import process_sentiment
 from modules.ml_model import train_models
 from modules.visualization import generate_all_visualizations
 from modules.superspreaders import detect_superspreaders
+from modules.io_utils import path_for, wait
 
 OUTPUT_DIR = "output/"
 CHART_DIR = "output/charts/"
@@ -28,10 +29,7 @@ def main():
 
     # 1. Fetch Reddit posts
     print("\n[1] Fetching Reddit posts...")
-    raw_df = fetch_all()
-
-    # Save raw posts for superspreaders
-    raw_df.to_csv("output/raw_posts.csv", index=False)
+    raw_df = fetch_all()   # also saves output/raw_posts.parquet for superspreaders
 
     # 2. Clean text + extract songs/artists
     print("\n[2] Cleaning dataset...")
@@ -45,13 +43,13 @@ def main():
     print("\n[4] Scraping comments + performing sentiment analysis...")
     sentiment_df = process_sentiment(trend_df)
 
-    # ➜ This step creates output/comments_raw.csv inside process_sentiment()
+    # ➜ This step creates output/comments_raw.parquet inside process_sentiment()
 
-    # 5. Detect superspreaders (NOW comments_raw.csv exists)
+    # 5. Detect superspreaders (NOW comments_raw.parquet exists)
     print("\n[5] Detecting superspreaders...")
     detect_superspreaders(
-        posts_csv="output/raw_posts.csv",
-        comments_csv="output/comments_raw.csv",
+        posts_path=path_for("raw_posts"),
+        comments_path=path_for("comments_raw"),
         out_csv="output/superspreaders.csv",
         out_graph="output/charts/superspreaders_graph.png",
         top_n=50
@@ -65,6 +63,12 @@ def main():
     print("\n[7] Generating charts...")
     generate_all_visualizations()
 
+    # make sure background dataset writes have finished
+    wait()
+
+    # human-readable copy of the final dataset
+    trend_df.to_csv("output/trend_dataset.csv", index=False)
+
     print("\n\n=== Pipeline Complete! 🚀 ===")
     print("All outputs saved in /output/")
     print("Charts saved in /output/charts/")
@@ -1,11 +1,17 @@
 import re
 import pandas as pd
+from modules import io_utils
 
 # Regex patterns
 SONG_PATTERN = r"\"([^\"]+)\""                 # text inside quotes: "Song Name"
 ARTIST_PATTERN = r"(?i)(?:by|from)\s+([A-Za-z0-9 .'-]+)"  # captures the artist name
 CLEAN_HTML = re.compile("<.*?>")               # remove HTML tags
 
+# Compiled once at import; used by both the scalar helpers and clean_dataset
+SONG_RE = re.compile(SONG_PATTERN)
+ARTIST_RE = re.compile(ARTIST_PATTERN)
+WS_RE = re.compile(r"\s+")
+
 
 def clean_text(text):
     """Clean unwanted artifacts from text."""
@@ -13,9 +19,9 @@ def clean_text(text):
         return ""
 
     text = text.lower()
-    text = re.sub(CLEAN_HTML, "", text)        # remove HTML
+    text = CLEAN_HTML.sub("", text)            # remove HTML
     text = text.replace("\n", " ")
-    text = re.sub(r"\s+", " ", text)           # collapse whitespace
+    text = WS_RE.sub(" ", text)                # collapse whitespace
 
     return text.strip()
 
@@ -24,7 +30,7 @@ def extract_song(text):
     """Extract song title from quotes."""
     if not isinstance(text, str):
         return None
-    match = re.search(SONG_PATTERN, text)
+    match = SONG_RE.search(text)
     return match.group(1).strip() if match else None
 
 
@@ -32,33 +38,39 @@ def extract_artist(text):
     """Extract artist after 'by' or 'from'."""
     if not isinstance(text, str):
         return None
-    m = re.search(ARTIST_PATTERN, text)
+    m = ARTIST_RE.search(text)
     return m.group(1).strip() if m else None
 
 
-def join_text(row):
-    """Combine title and body text."""
-    t1 = row.get("title", "") or ""
-    t2 = row.get("text", "") or ""
-    return f"{t1} {t2}"
+def _text_column(df, col):
+    """Return a column as clean strings ('' for missing column / NaN)."""
+    if col not in df.columns:
+        return pd.Series("", index=df.index)
+    return df[col].fillna("").astype(str)
 
 
 def clean_dataset(df):
     """Main cleaning pipeline."""
     df = df.copy()
 
-    # Build combined text
-    df["full_text"] = df.apply(join_text, axis=1)
+    # Build combined text (vectorized; raw posts may not have a 'text' column)
+    df["full_text"] = _text_column(df, "title").str.cat(_text_column(df, "text"), sep=" ")
 
-    # Clean
-    df["clean_text"] = df["full_text"].apply(clean_text)
+    # Clean: same steps as clean_text(), but on the whole Series at once
+    df["clean_text"] = (
+        df["full_text"]
+        .str.lower()
+        .str.replace(CLEAN_HTML, "", regex=True)
+        .str.replace(WS_RE, " ", regex=True)
+        .str.strip()
+    )
 
     # Extract song + artist
-    df["song"] = df["clean_text"].apply(extract_song)
-    df["artist"] = df["clean_text"].apply(extract_artist)
+    df["song"] = df["clean_text"].str.extract(SONG_RE, expand=False).str.strip()
+    df["artist"] = df["clean_text"].str.extract(ARTIST_RE, expand=False).str.strip()
 
     # Save cleaned version
-    df.to_csv("output/cleaned_posts.csv", index=False)
-    print("Saved cleaned dataset: output/cleaned_posts.csv")
+    path = io_utils.save(df, "cleaned_posts")
+    print(f"Writing cleaned dataset: {path}")
 
     return df
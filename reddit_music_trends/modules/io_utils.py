@@ -0,0 +1,79 @@
+# modules/io_utils.py
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import pyarrow.parquet as pq
+
+OUTPUT_DIR = "output"
+
+# Disk writes run in the background so the next stage doesn't wait on them
+_write_pool = ThreadPoolExecutor(max_workers=4)
+_pending = {}   # path -> Future of an in-flight write
+
+
+def path_for(name):
+    """Parquet path of a pipeline dataset, e.g. 'trend_dataset'."""
+    return os.path.join(OUTPUT_DIR, f"{name}.parquet")
+
+
+def resolve(name):
+    """
+    Path to read a dataset from: its Parquet file, or a CSV of the same name
+    (e.g. the shipped sample data) if no Parquet file exists yet.
+    """
+    path = path_for(name)
+    csv_path = os.path.join(OUTPUT_DIR, f"{name}.csv")
+    if path not in _pending and not os.path.exists(path) and os.path.exists(csv_path):
+        return csv_path
+    return path
+
+
+def _write_bytes(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def save(df, name):
+    """
+    Write a pipeline dataset as zstd-compressed Parquet. Returns the path.
+    The frame is encoded right away (later changes to df don't leak in);
+    only the file write happens in the background, so the file is not on
+    disk yet when this returns. Call wait(path) to block until it is, and
+    to get any write error raised at that point.
+    """
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    path = path_for(name)
+    buf = io.BytesIO()
+    df.to_parquet(buf, engine="pyarrow", compression="zstd", index=False)
+    return write_bytes(path, buf.getbuffer())
+
+
+def write_bytes(path, data):
+    """Write already-encoded bytes to path in the background (see save()). Returns the path."""
+    wait(path)   # never two writes of the same file at once
+    _pending[path] = _write_pool.submit(_write_bytes, path, data)
+    return path
+
+
+def wait(path=None):
+    """Block until pending writes (of one path, or all of them) are on disk."""
+    for p in ([path] if path else list(_pending)):
+        future = _pending.pop(p, None)
+        if future is not None:
+            future.result()
+
+
+def load(name, columns=None):
+    """
+    Read a dataset written by save() (falls back to a CSV, see resolve()).
+    If columns is given, only those of them that exist in the file are read.
+    """
+    path = resolve(name)
+    wait(path)
+    if path.endswith(".csv"):
+        return pd.read_csv(path, usecols=(lambda c: c in columns) if columns is not None else None)
+    if columns is not None:
+        present = set(pq.read_schema(path).names)
+        columns = [c for c in columns if c in present]
+    return pd.read_parquet(path, engine="pyarrow", columns=columns)
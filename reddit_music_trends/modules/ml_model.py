@@ -1,16 +1,19 @@
 import pandas as pd
 import numpy as np
+from modules import io_utils
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import OneHotEncoder
+from sklearn.compose import ColumnTransformer
+from sklearn.pipeline import Pipeline
 from sklearn.metrics import classification_report, accuracy_score, confusion_matrix
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.linear_model import LogisticRegression
 import pickle
 from sklearn.impute import SimpleImputer
 
-def load_datasets(trend_path="output/trend_dataset.csv", sent_path="output/reddit_comment_sentiment.csv"):
-    trend_df = pd.read_csv(trend_path, dtype=str)
-    sent_df = pd.read_csv(sent_path, dtype=str)
+def load_datasets(trend_name="trend_dataset", sent_name="reddit_comment_sentiment"):
+    trend_df = io_utils.load(trend_name)
+    sent_df = io_utils.load(sent_name)
 
     # --- Ensure a common join key 'permalink' exists in both dataframes ---
     # If trend_df has 'permalink' already, great. If it has 'url', copy it.
@@ -34,42 +37,47 @@ def load_datasets(trend_path="output/trend_dataset.csv", sent_path="output/reddi
     return df
 
 
+NUMERIC_FEATURES = ["score", "num_comments", "engagement_score",
+                    "avg_neg", "avg_neu", "avg_pos", "avg_compound"]
+CATEGORICAL_FEATURES = ["subreddit"]
+
+
 def prepare_features(df):
     df = df.copy()
 
     # Target variable
     y = df["engagement_label"]
 
-    # Numeric features
-    numeric = df[["score", "num_comments", "engagement_score",
-                  "avg_neg", "avg_neu", "avg_pos", "avg_compound"]]
+    # Numeric features (float32) + categorical: subreddit
+    X = df[NUMERIC_FEATURES].astype(np.float32)
+    X[CATEGORICAL_FEATURES] = df[CATEGORICAL_FEATURES].astype(str)
 
-    # Categorical: subreddit, trend keywords
-    cat_features = df[["subreddit"]].astype(str)
+    return X, y
 
-    enc = OneHotEncoder(sparse_output=False, handle_unknown="ignore")
-    cat_encoded = enc.fit_transform(cat_features)
 
-    X = np.hstack([numeric.values, cat_encoded])
+def make_preprocessor():
+    """Mean-impute numeric features and one-hot the subreddit (sparse float32 output)."""
+    return ColumnTransformer([
+        ("num", SimpleImputer(strategy="mean"), NUMERIC_FEATURES),
+        ("cat", OneHotEncoder(handle_unknown="ignore", dtype=np.float32), CATEGORICAL_FEATURES)
+    ], sparse_threshold=1.0)
 
-    return X, y, enc
 
 def train_models():
     df = load_datasets()
-    X, y, encoder = prepare_features(df)
+    X, y = prepare_features(df)
 
     X_train, X_test, y_train, y_test = train_test_split(
         X, y, test_size=0.25, random_state=42
     )
 
-    # Ensure X arrays are numeric numpy arrays (if X is a DataFrame this will work too)
-    # This helps SimpleImputer behave predictably.
-    import numpy as np
-    X_train = np.array(X_train, dtype=float)
-    X_test = np.array(X_test, dtype=float)
-
     print("\nTraining Random Forest...")
-    rf = RandomForestClassifier(n_estimators=200, random_state=42)
+    # trees are fit (and predict) in parallel on all cores
+    rf = Pipeline([
+        ("prep", make_preprocessor()),
+        ("clf", RandomForestClassifier(n_estimators=200, random_state=42, n_jobs=-1,
+                                       max_features="sqrt", max_depth=None))
+    ])
     rf.fit(X_train, y_train)
 
     preds_rf = rf.predict(X_test)
@@ -78,26 +86,24 @@ def train_models():
     print(classification_report(y_test, preds_rf))
 
     # ----------------------------
-    # Logistic Regression (with NaN handling via imputation)
+    # Logistic Regression (same preprocessing pipeline)
     # ----------------------------
     print("\nTraining Logistic Regression...")
 
-    # Impute missing values (mean strategy)
-    imputer = SimpleImputer(strategy="mean")
-    X_train_lr = imputer.fit_transform(X_train)
-    X_test_lr = imputer.transform(X_test)
-
-    lr = LogisticRegression(max_iter=2000)
-    lr.fit(X_train_lr, y_train)
+    lr = Pipeline([
+        ("prep", make_preprocessor()),
+        ("clf", LogisticRegression(max_iter=2000))
+    ])
+    lr.fit(X_train, y_train)
 
-    preds_lr = lr.predict(X_test_lr)
+    preds_lr = lr.predict(X_test)
     print("\nLogistic Regression Results:")
     print("Accuracy:", accuracy_score(y_test, preds_lr))
     print(classification_report(y_test, preds_lr))
 
-    # Save best model (Random Forest) and also save imputer + encoder so pipeline can be reproduced
+    # Save best model (Random Forest) as a full pipeline: raw feature frame in, label out
     with open("output/model.pkl", "wb") as f:
-        pickle.dump({"model": rf, "encoder": encoder, "imputer": imputer}, f)
+        pickle.dump(rf, f)
 
     print("\nSaved model to output/model.pkl")
 
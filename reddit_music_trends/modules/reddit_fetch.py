@@ -1,5 +1,7 @@
-import praw
+import asyncio
+import asyncpraw
 import pandas as pd
+from modules import io_utils
 
 # -------------------------------------------
 # ENTER YOUR REAL CREDENTIALS HERE
@@ -14,36 +16,50 @@ SUBREDDITS = ["Music", "PopHeads", "HipHopHeads"]
 POST_LIMIT = 200
 
 
-def fetch_all():
-    """Fetch posts using official Reddit API (PRAW)."""
+async def fetch_sub(reddit, sub):
+    """Fetch hot posts from one subreddit."""
+    print(f"Fetching from r/{sub}...")
+
+    posts = []
+    subreddit = await reddit.subreddit(sub)
+    async for post in subreddit.hot(limit=POST_LIMIT):
+        posts.append({
+            "subreddit": sub,
+            "title": post.title,
+            "score": post.score,
+            "num_comments": post.num_comments,
+            "created_utc": post.created_utc,
+            "url": post.url
+        })
+    return posts
+
+
+async def fetch_all_async():
+    """Fetch all SUBREDDITS concurrently using the async Reddit API (asyncpraw)."""
 
-    reddit = praw.Reddit(
+    async with asyncpraw.Reddit(
         client_id=CLIENT_ID,
         client_secret=CLIENT_SECRET,
         user_agent=USER_AGENT,
         username=USERNAME,
         password=PASSWORD
-    )
+    ) as reddit:
 
-    print("\nAuthenticated as:", reddit.user.me())
+        print("\nAuthenticated as:", await reddit.user.me())
 
-    all_posts = []
+        # one listing stream per subreddit, results kept in SUBREDDITS order
+        results = await asyncio.gather(*[fetch_sub(reddit, sub) for sub in SUBREDDITS])
 
-    for sub in SUBREDDITS:
-        print(f"Fetching from r/{sub}...")
+    return [post for posts in results for post in posts]
+
+
+def fetch_all():
+    """Fetch posts using official Reddit API (asyncpraw)."""
 
-        for post in reddit.subreddit(sub).hot(limit=POST_LIMIT):
-            all_posts.append({
-                "subreddit": sub,
-                "title": post.title,
-                "score": post.score,
-                "num_comments": post.num_comments,
-                "created_utc": post.created_utc,
-                "url": post.url
-            })
+    all_posts = asyncio.run(fetch_all_async())
 
     df = pd.DataFrame(all_posts)
-    df.to_csv("output/raw_posts.csv", index=False)
+    path = io_utils.save(df, "raw_posts")
 
-    print(f"\nSaved {len(df)} posts → output/raw_posts.csv")
+    print(f"\nWriting {len(df)} posts → {path}")
     return df
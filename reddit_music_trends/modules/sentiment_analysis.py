@@ -1,17 +1,55 @@
 # modules/sentiment_analysis.py
-import requests
+import requests_cache
+import numpy as np
 import pandas as pd
 import time
 import os
-from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from modules import io_utils
+from vaderSentiment.vaderSentiment import (
+    SentimentIntensityAnalyzer, SentiText, NEGATE, BOOSTER_DICT, SPECIAL_CASES,
+    allcap_differential, normalize
+)
 
 analyzer = SentimentIntensityAnalyzer()
 
 USER_AGENT = "music_trend_research:v1.0 (by u/yourusername)"
 
+FETCH_WORKERS = 12        # concurrent comment fetches
+REQUEST_INTERVAL = 0.5    # polite gap between Reddit requests (all workers combined)
+
 # Helper: ensure output folder exists
 os.makedirs("output", exist_ok=True)
 
+# Shared keep-alive session: reuses TCP/TLS connections across fetches and
+# keeps responses in an on-disk cache, so re-runs skip already fetched posts
+CACHE_PATH = "output/.reddit_cache"
+CACHE_EXPIRE = 6 * 3600   # seconds
+SESSION = requests_cache.CachedSession(CACHE_PATH, backend="sqlite", expire_after=CACHE_EXPIRE)
+SESSION.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=32))
+
+
+class RateLimiter:
+    """Thread-safe limiter: at most one request per `interval` seconds overall."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+rate_limiter = RateLimiter(REQUEST_INTERVAL)
+
 def _full_permalink(permalink):
     """Return a full reddit URL for a permalink or url-like string."""
     if not isinstance(permalink, str):
@@ -24,9 +62,10 @@ def _full_permalink(permalink):
     # if it's just an id (t3_xxx or id), try leaving as-is
     return p
 
-def fetch_comments(permalink, limit=50, depth=1):
+def fetch_comments(permalink, limit=50, depth=1, session=None):
     """
     Fetch comments for a post permalink (handles nested replies to limited depth).
+    Uses the shared pooled + cached SESSION unless another session is given.
     Returns a list of dicts: {"author": ..., "body": ...}
     """
     url = _full_permalink(permalink)
@@ -39,8 +78,13 @@ def fetch_comments(permalink, limit=50, depth=1):
         url = url + ".json?limit=" + str(limit)
 
     headers = {"User-Agent": USER_AGENT}
+    session = session or SESSION
+    # cached responses don't hit Reddit, so they don't need a rate-limit slot
+    cache = getattr(session, "cache", None)
+    if cache is None or not cache.contains(url=url):
+        rate_limiter.wait()
     try:
-        r = requests.get(url, headers=headers, timeout=15)
+        r = session.get(url, headers=headers, timeout=15)
         if r.status_code != 200:
             return []
         data = r.json()
@@ -82,6 +126,116 @@ def analyze_sentiment(text):
         return {"neg": 0.0, "neu": 1.0, "pos": 0.0, "compound": 0.0}
     return analyzer.polarity_scores(text)
 
+SENTIMENT_KEYS = ("neg", "neu", "pos", "compound")
+
+# --- Fast path for plain comments ---------------------------------------
+# VADER only changes a word's lexicon valence when rule tokens are present
+# (negations, boosters, "no"/"but"/"least"/"this", ALL CAPS, idioms, emoji).
+# Comments without them score as plain lexicon sums, which are computed for
+# the whole batch with NumPy; all other comments go through VADER itself.
+# This mirrors vaderSentiment 3.3.2 (pinned in requirements.txt) and must be
+# re-checked against polarity_scores() whenever that version changes.
+_RULE_WORDS = frozenset(NEGATE) | frozenset(BOOSTER_DICT) | {"no", "but", "least", "this"}
+_RULE_NGRAMS = frozenset(SPECIAL_CASES) | frozenset(k for k in BOOSTER_DICT if " " in k)
+
+def _plain_tokens(text):
+    """Lowercased VADER tokens of text, or None if any VADER rule could apply."""
+    if not isinstance(text, str) or not text.isascii() or text.strip() == "":
+        return None
+    tokens = [SentiText._strip_punc_if_word(w) for w in text.split()]
+    low = [w.lower() for w in tokens]
+    # ALL CAPS emphasis: only lexicon words, and only if some words aren't caps
+    if allcap_differential(tokens) and any(
+            w.isupper() and l in analyzer.lexicon for w, l in zip(tokens, low)):
+        return None
+    if not _RULE_WORDS.isdisjoint(low) or any("n't" in w for w in low):
+        return None
+    bigrams = [" ".join(p) for p in zip(low, low[1:])]
+    trigrams = [" ".join(p) for p in zip(low, low[1:], low[2:])]
+    if not _RULE_NGRAMS.isdisjoint(bigrams + trigrams):
+        return None
+    return low
+
+def _score_plain(token_lists, texts):
+    """VADER scores for rule-free comments, as an (N, 4) array."""
+    lengths = np.fromiter(map(len, token_lists), dtype=np.intp, count=len(token_lists))
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    lexicon = analyzer.lexicon
+    vals = np.fromiter(
+        (lexicon.get(t, 0.0) for tokens in token_lists for t in tokens),
+        dtype=np.float64,
+        count=int(lengths.sum())
+    )
+    parts = np.column_stack((
+        vals,
+        np.where(vals > 0, vals + 1, 0.0),
+        np.where(vals < 0, vals - 1, 0.0),
+        vals == 0
+    ))
+
+    # Left-to-right sums per comment (like VADER's sum()), vectorized across
+    # comments: longest first, so comments still running are a prefix.
+    order = np.argsort(-lengths, kind="stable")
+    neg_sorted_lengths = -lengths[order]
+    sorted_sums = np.zeros((len(order), 4))
+    for j in range(lengths.max()):
+        k = np.searchsorted(neg_sorted_lengths, -j, side="left")
+        sorted_sums[:k] += parts[starts[order[:k]] + j]
+    sums = np.empty_like(sorted_sums)
+    sums[order] = sorted_sums
+    sum_s, pos_sum, neg_sum, neu_count = sums.T
+
+    # punctuation emphasis ("!" and "?") and normalization: VADER's own functions
+    amp = np.fromiter((analyzer._punctuation_emphasis(t) for t in texts),
+                      dtype=np.float64, count=len(texts))
+
+    sum_s = sum_s + np.sign(sum_s) * amp
+    compound = np.fromiter(map(normalize, sum_s.tolist()), dtype=np.float64, count=len(sum_s))
+    more_pos, more_neg = pos_sum > -neg_sum, pos_sum < -neg_sum
+    pos_sum = np.where(more_pos, pos_sum + amp, pos_sum)
+    neg_sum = np.where(more_neg, neg_sum - amp, neg_sum)
+    total = pos_sum - neg_sum + neu_count
+
+    # Python's round() (not np.round) so ties round exactly as VADER does
+    scores = np.column_stack((np.abs(neg_sum) / total, neu_count / total, pos_sum / total, compound))
+    digits = (3, 3, 3, 4)
+    return np.array([[round(v, d) for v, d in zip(row, digits)] for row in scores.tolist()])
+
+def score_comments(bodies):
+    """Sentiment scores for a batch of comments: (N, 4) neg/neu/pos/compound."""
+    scores = np.empty((len(bodies), 4))
+    plain_rows, plain_tokens = [], []
+    for i, body in enumerate(bodies):
+        tokens = _plain_tokens(body)
+        if tokens is None:
+            s = analyze_sentiment(body)
+            scores[i] = [s[k] for k in SENTIMENT_KEYS]
+        else:
+            plain_rows.append(i)
+            plain_tokens.append(tokens)
+    if plain_rows:
+        scores[plain_rows] = _score_plain(plain_tokens, [bodies[i] for i in plain_rows])
+    return scores
+
+def average_sentiment(bodies, post_idx, n_posts):
+    """
+    Score every comment body in one batch and average per post.
+    - bodies: flat list of comment texts (all posts)
+    - post_idx: post index for each body, in non-decreasing order
+    Returns an (n_posts, 4) array of mean neg/neu/pos/compound
+    (all zeros for posts without comments).
+    """
+    scores = score_comments(bodies)
+
+    counts = np.bincount(np.asarray(post_idx, dtype=np.intp), minlength=n_posts)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    has_comments = counts > 0
+
+    sums = np.zeros((n_posts, 4))
+    if has_comments.any():
+        sums[has_comments] = np.add.reduceat(scores, starts[has_comments], axis=0)
+    return sums / np.maximum(counts, 1)[:, None]
+
 def process_sentiment(df, comment_limit_per_post=50):
     """
     Main entrypoint:
@@ -110,66 +264,71 @@ def process_sentiment(df, comment_limit_per_post=50):
             # fallback to title as identifier
             pl_col = df.columns[0]
 
-    for i, row in df.iterrows():
+    # one entry per post, plus a flat list of every comment body
+    # (scored in a single batch after all fetches)
+    bodies = []
+    post_idx = []
+
+    # drop stale cache entries up front so cache hits below are always fresh
+    SESSION.cache.delete(expired=True)
+
+    # fetch comments concurrently; rate_limiter keeps the overall request rate polite
+    rows = list(zip(df.index, df.to_dict("records")))
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as ex:
+        fetched = list(ex.map(
+            lambda r: fetch_comments(r[1].get(pl_col, ""), limit=comment_limit_per_post),
+            rows
+        ))
+
+    for (i, row), comments in zip(rows, fetched):
         permalink = row.get(pl_col, "")
         title = row.get("title", "")
         song = row.get("song", "")
         artist = row.get("artist", "")
 
-        comments = fetch_comments(permalink, limit=comment_limit_per_post)
         # collect raw authors for superspreader analysis
         for c in comments:
             raw_comments.append({
                 "post_id": _full_permalink(permalink) or str(i),
                 "comment_author": c.get("author", "[deleted]")
             })
-
-        # compute sentiment per comment
-        sentiment_scores = [analyze_sentiment(c.get("body", "")) for c in comments]
-
-        if sentiment_scores:
-            avg_neg = sum(s["neg"] for s in sentiment_scores) / len(sentiment_scores)
-            avg_neu = sum(s["neu"] for s in sentiment_scores) / len(sentiment_scores)
-            avg_pos = sum(s["pos"] for s in sentiment_scores) / len(sentiment_scores)
-            avg_comp = sum(s["compound"] for s in sentiment_scores) / len(sentiment_scores)
-        else:
-            avg_neg = avg_neu = avg_pos = avg_comp = 0.0
+            bodies.append(c.get("body", ""))
+            post_idx.append(len(comments_summary))
 
         comments_summary.append({
             "permalink": _full_permalink(permalink) or "",
             "title": title,
             "song": song,
-            "artist": artist,
-            "avg_neg": avg_neg,
-            "avg_neu": avg_neu,
-            "avg_pos": avg_pos,
-            "avg_compound": avg_comp
+            "artist": artist
         })
 
-        # polite sleep to avoid hammering Reddit
-        time.sleep(0.5)
-
     # Save raw comments for superspreader analysis (deduplicated)
     try:
         if raw_comments:
             raw_df = pd.DataFrame(raw_comments)
             # normalize column names
             if "post_id" in raw_df.columns and "comment_author" in raw_df.columns:
-                raw_df.to_csv("output/comments_raw.csv", index=False)
-                print("Saved raw comments: output/comments_raw.csv")
+                path = io_utils.save(raw_df, "comments_raw")
+                io_utils.wait(path)   # surface write errors here, not in a later stage
+                print(f"Saved raw comments: {path}")
             else:
                 # fallback: save whatever we have
-                raw_df.to_csv("output/comments_raw.csv", index=False)
-                print("Saved raw comments (fallback format): output/comments_raw.csv")
+                path = io_utils.save(raw_df, "comments_raw")
+                io_utils.wait(path)
+                print(f"Saved raw comments (fallback format): {path}")
         else:
             # create an empty file if no comments were found
-            pd.DataFrame(columns=["post_id", "comment_author"]).to_csv("output/comments_raw.csv", index=False)
-            print("Saved empty raw comments: output/comments_raw.csv")
+            path = io_utils.save(pd.DataFrame(columns=["post_id", "comment_author"]), "comments_raw")
+            io_utils.wait(path)
+            print(f"Saved empty raw comments: {path}")
     except Exception as e:
         print("Warning: could not save raw comments:", e)
 
     # Build summary DataFrame
     df_sent = pd.DataFrame(comments_summary)
+    if not df_sent.empty:
+        avg_cols = ["avg_" + k for k in SENTIMENT_KEYS]
+        df_sent[avg_cols] = average_sentiment(bodies, post_idx, len(df_sent))
 
     # Label final sentiment
     if not df_sent.empty:
@@ -182,9 +341,10 @@ def process_sentiment(df, comment_limit_per_post=50):
 
     # Save sentiment summary
     try:
-        df_sent.to_csv("output/reddit_comment_sentiment.csv", index=False)
-        print("Saved comment sentiment: output/reddit_comment_sentiment.csv")
+        path = io_utils.save(df_sent, "reddit_comment_sentiment")
+        io_utils.wait(path)   # surface write errors here, not in a later stage
+        print(f"Saved comment sentiment: {path}")
     except Exception as e:
-        print("Warning: could not save reddit_comment_sentiment.csv:", e)
+        print("Warning: could not save reddit_comment_sentiment:", e)
 
     return df_sent
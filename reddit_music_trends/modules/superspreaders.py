@@ -1,19 +1,28 @@
 # modules/superspreaders.py
+import io
+import numpy as np
 import pandas as pd
 import networkx as nx
+import igraph as ig
+import scipy.sparse as sp
 import matplotlib.pyplot as plt
 from collections import Counter
-from itertools import combinations
 import os
+from modules import io_utils
 
-def _read_csv_flex(path):
-    """Robust CSV loader returning DataFrame or None."""
+def _read_table_flex(path):
+    """Robust Parquet/CSV loader returning DataFrame or None."""
+    io_utils.wait(path)   # file may still be written in the background
+    if not os.path.exists(path) and path.endswith(".parquet"):
+        path = path[:-len(".parquet")] + ".csv"   # e.g. the shipped CSV sample data
     if not os.path.exists(path):
         return None
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
     return pd.read_csv(path, dtype=str)
 
-def build_interaction_graph(posts_csv="output/raw_posts.csv",
-                            comments_csv="output/comments_raw.csv",
+def build_interaction_graph(posts_path="output/raw_posts.parquet",
+                            comments_path="output/comments_raw.parquet",
                             min_edge_weight=1):
     """
     Build interaction graph using:
@@ -21,13 +30,13 @@ def build_interaction_graph(posts_csv="output/raw_posts.csv",
       - co-comment edges: commenters on same post are connected (co-discussion)
     Returns a NetworkX Graph (undirected, weighted).
     """
-    posts_df = _read_csv_flex(posts_csv)
-    comments_df = _read_csv_flex(comments_csv)
+    posts_df = _read_table_flex(posts_path)
+    comments_df = _read_table_flex(comments_path)
 
     if posts_df is None:
-        raise FileNotFoundError(f"Posts file not found: {posts_csv}")
+        raise FileNotFoundError(f"Posts file not found: {posts_path}")
     if comments_df is None:
-        raise FileNotFoundError(f"Comments file not found: {comments_csv}")
+        raise FileNotFoundError(f"Comments file not found: {comments_path}")
 
     # --- Detect post id/permalink column and post author column robustly ---
     post_id_col = None
@@ -109,68 +118,95 @@ def build_interaction_graph(posts_csv="output/raw_posts.csv",
 
     # Add nodes: all unique users
     all_users = set(posts_df["post_author"].unique()).union(set(comments_df["comment_author"].unique()))
-    for u in all_users:
-        G.add_node(u)
+    G.add_nodes_from(all_users)
 
-    # author <-> commenter edges
+    # author <-> commenter edges (boolean masks instead of a per-row loop)
     merged = comments_df.merge(posts_df, on="post_id", how="left")
-    author_comment_pairs = []
-    for _, row in merged.iterrows():
-        commenter = str(row["comment_author"])
-        post_author = str(row["post_author"]) if pd.notna(row["post_author"]) else "[deleted]"
-        # ignore if commenter missing
-        if commenter == "" or commenter == "[deleted]":
-            continue
-        if commenter == post_author:
-            continue
-        author_comment_pairs.append((post_author, commenter))
-
-    # Count and add weights
-    counter_ac = Counter(author_comment_pairs)
-    for (a, b), w in counter_ac.items():
-        if w >= min_edge_weight:
-            if G.has_edge(a, b):
-                G[a][b]["weight"] += w
-            else:
-                G.add_edge(a, b, weight=w, type="author_comment")
-
-    # co-comment edges: commenters who commented on same post
-    for pid, group in comments_df.groupby("post_id"):
-        commenters = list(group["comment_author"].unique())
-        if len(commenters) < 2:
-            continue
-        for u, v in combinations(commenters, 2):
-            if u == v:
-                continue
-            if G.has_edge(u, v):
-                G[u][v]["weight"] += 1
-            else:
-                G.add_edge(u, v, weight=1, type="co_comment")
+    commenter = merged["comment_author"].astype(str)
+    post_author = merged["post_author"].fillna("[deleted]").astype(str)
+    # ignore missing commenters and self-replies
+    keep = (commenter != "") & (commenter != "[deleted]") & (commenter != post_author)
+
+    # Count pairs; undirected edges are keyed by frozenset so (a, b) and (b, a)
+    # (and overlapping co-comment pairs below) accumulate into one weight
+    ac = pd.DataFrame({"post_author": post_author[keep], "comment_author": commenter[keep]})
+    ac_weights = ac.groupby(["post_author", "comment_author"], sort=False).size()
+    ac_weights = ac_weights[ac_weights >= min_edge_weight]
+    weights = Counter()
+    for (a, b), w in ac_weights.items():
+        weights[frozenset((a, b))] += int(w)
+    author_comment_edges = set(weights)
+
+    # co-comment edges: commenters who commented on same post.
+    # Self-merge on post_id yields every commenter pair; u < v keeps each pair once.
+    commenters = comments_df.drop_duplicates(["post_id", "comment_author"])
+    pairs = commenters.merge(commenters, on="post_id")
+    pairs = pairs[pairs["comment_author_x"] < pairs["comment_author_y"]]
+    co_weights = pairs.groupby(["comment_author_x", "comment_author_y"]).size()
+    for (u, v), w in co_weights.items():
+        weights[frozenset((u, v))] += int(w)
+
+    # Add all edges in bulk (type = first interaction kind seen for the pair)
+    G.add_weighted_edges_from(
+        ((*e, w) for e, w in weights.items() if e in author_comment_edges),
+        type="author_comment"
+    )
+    G.add_weighted_edges_from(
+        ((*e, w) for e, w in weights.items() if e not in author_comment_edges),
+        type="co_comment"
+    )
 
     return G
 
-def compute_centralities(G):
-    """Compute degree, betweenness, and pagerank. Returns DataFrame."""
+def compute_centralities(G, sample_k=500, seed=42):
+    """
+    Compute degree, betweenness, and pagerank. Returns DataFrame.
+    The graph is exported once to a sparse CSR adjacency matrix, which feeds
+    igraph so the heavy passes run in C; values are normalized the same way
+    as NetworkX's degree/betweenness.
+    On graphs with more than sample_k nodes, betweenness is estimated from
+    sample_k random source nodes (Brandes pivot sampling, like NetworkX's
+    k=...). It is approximate, but the top-ranked users are stable.
+    Pass sample_k=None for exact betweenness.
+    """
     if G is None or G.number_of_nodes() == 0:
         return pd.DataFrame(columns=["user", "degree", "betweenness", "pagerank"])
 
+    users = list(G.nodes())
+    n = len(users)
+    A = nx.to_scipy_sparse_array(G, nodelist=users, weight="weight", format="csr")
+
+    # each undirected edge once (upper triangle) with its weight
+    upper = sp.triu(A, format="coo")
+    ig_g = ig.Graph(n=n, edges=np.column_stack((upper.row, upper.col)))
+    ig_g.es["weight"] = upper.data.tolist()
+
     # degree centrality (normalized)
-    deg = nx.degree_centrality(G)
-    btw = nx.betweenness_centrality(G, normalized=True)
+    deg = np.diff(A.indptr).astype(float)   # neighbours per row
+    deg = deg / (n - 1) if n > 1 else np.ones(n)
+
+    # unweighted shortest paths, as before
+    if sample_k is None or sample_k >= n:
+        btw = np.asarray(ig_g.betweenness(directed=False), dtype=float)
+    else:
+        pivots = np.random.default_rng(seed).choice(n, size=sample_k, replace=False)
+        btw = np.asarray(ig_g.betweenness(directed=False, sources=pivots.tolist(),
+                                          targets=range(n)), dtype=float)
+        btw *= n / sample_k
+    if n > 2:
+        btw *= 2.0 / ((n - 1) * (n - 2))
+
     try:
-        pr = nx.pagerank(G, weight="weight")
+        pr = ig_g.pagerank(weights="weight")
     except Exception:
-        pr = {n: 0.0 for n in G.nodes()}
-
-    rows = []
-    for n in G.nodes():
-        rows.append({
-            "user": n,
-            "degree": float(deg.get(n, 0.0)),
-            "betweenness": float(btw.get(n, 0.0)),
-            "pagerank": float(pr.get(n, 0.0))
-        })
-    df = pd.DataFrame(rows)
+        pr = np.zeros(n)
+
+    df = pd.DataFrame({
+        "user": users,
+        "degree": deg,
+        "betweenness": btw,
+        "pagerank": np.asarray(pr, dtype=float)
+    })
     df = df.sort_values(by=["pagerank", "degree", "betweenness"], ascending=False).reset_index(drop=True)
     return df
 
@@ -190,7 +226,14 @@ def draw_graph(G, centrality_df, out_png="output/charts/superspreaders_graph.png
     H = G.subgraph(top_nodes).copy()
 
     plt.figure(figsize=(12, 10))
-    pos = nx.spring_layout(H, k=0.5, seed=42)
+    if H.number_of_nodes() > 200:
+        # large subgraph: force-directed layout in igraph's C core
+        nodes = list(H.nodes())
+        idx = {u: i for i, u in enumerate(nodes)}
+        ig_h = ig.Graph(n=len(nodes), edges=[(idx[u], idx[v]) for u, v in H.edges()])
+        pos = dict(zip(nodes, ig_h.layout_fruchterman_reingold().coords))
+    else:
+        pos = nx.spring_layout(H, k=0.5, iterations=30, seed=42)
     pr_map = centrality_df.set_index("user")["pagerank"].to_dict()
     sizes = [5000 * pr_map.get(n, 0.001) + 100 for n in H.nodes()]
     nx.draw_networkx_nodes(H, pos, node_size=sizes, alpha=0.85)
@@ -199,23 +242,29 @@ def draw_graph(G, centrality_df, out_png="output/charts/superspreaders_graph.png
     nx.draw_networkx_labels(H, pos, labels, font_size=8)
     plt.title("Top Superspreaders (subgraph)")
     plt.axis("off")
-    plt.savefig(out_png, bbox_inches="tight", dpi=150)
+    # render now, write the PNG to disk in the background
+    buf = io.BytesIO()
+    plt.savefig(buf, format="png", bbox_inches="tight", dpi=150,
+                pil_kwargs={"compress_level": 1})   # fast zlib level
     plt.close()
-    print(f"Saved graph image to {out_png}")
+    io_utils.write_bytes(out_png, buf.getbuffer())
+    print(f"Writing graph image to {out_png}")
 
-def detect_superspreaders(posts_csv="output/raw_posts.csv",
-                          comments_csv="output/comments_raw.csv",
+def detect_superspreaders(posts_path="output/raw_posts.parquet",
+                          comments_path="output/comments_raw.parquet",
                           out_csv="output/superspreaders.csv",
                           out_graph="output/charts/superspreaders_graph.png",
-                          top_n=50):
+                          top_n=50,
+                          sample_k=500):
     """
     High-level function to run the full detection pipeline and save outputs.
+    sample_k caps the pivots used for betweenness (None = exact).
     """
     print("Building interaction graph...")
-    G = build_interaction_graph(posts_csv=posts_csv, comments_csv=comments_csv)
+    G = build_interaction_graph(posts_path=posts_path, comments_path=comments_path)
     print(f"Graph built: {G.number_of_nodes()} nodes, {G.number_of_edges()} edges")
     print("Computing centralities...")
-    df_cent = compute_centralities(G)
+    df_cent = compute_centralities(G, sample_k=sample_k)
     save_top_influencers(df_cent, path=out_csv, top_n=top_n)
     draw_graph(G, df_cent, out_png=out_graph, top_n=top_n)
     return df_cent
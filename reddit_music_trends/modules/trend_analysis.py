@@ -1,4 +1,6 @@
+import numpy as np
 import pandas as pd
+from modules import io_utils
 
 # Trend-related keywords to detect in the text
 TREND_KEYWORDS = [
@@ -8,6 +10,11 @@ TREND_KEYWORDS = [
     "breakout", "new hit", "buzz", "hype", "hyped", "fresh"
 ]
 
+# Engagement thresholds (score / comments), shared by engagement_level and analyze_trends
+TRENDING_SCORE, TRENDING_COMMENTS = 500, 200
+EMERGING_SCORE, EMERGING_COMMENTS = 200, 80
+STABLE_SCORE = 50
+
 
 def detect_keywords(text):
     """Detect any trend-related keywords."""
@@ -25,11 +32,11 @@ def detect_keywords(text):
 
 def engagement_level(score, comments):
     """Categorize engagement heuristically."""
-    if score > 500 or comments > 200:
+    if score > TRENDING_SCORE or comments > TRENDING_COMMENTS:
         return "TRENDING"
-    if score > 200 or comments > 80:
+    if score > EMERGING_SCORE or comments > EMERGING_COMMENTS:
         return "EMERGING"
-    if score > 50:
+    if score > STABLE_SCORE:
         return "STABLE"
     return "LOW"
 
@@ -47,19 +54,22 @@ def analyze_trends(df):
     df = df.copy()
 
     # Detect trend keywords
-    df["trend_keywords"] = df["clean_text"].apply(detect_keywords)
-
-    # Engagement labels
-    df["engagement_label"] = df.apply(
-        lambda r: engagement_level(r["score"], r["num_comments"]),
-        axis=1
+    df["trend_keywords"] = df["clean_text"].map(detect_keywords)
+
+    score = pd.to_numeric(df["score"], errors="coerce").to_numpy()
+    comments = pd.to_numeric(df["num_comments"], errors="coerce").to_numpy()
+
+    # Engagement labels (engagement_level's rules, on whole arrays)
+    df["engagement_label"] = np.select(
+        [(score > TRENDING_SCORE) | (comments > TRENDING_COMMENTS),
+         (score > EMERGING_SCORE) | (comments > EMERGING_COMMENTS),
+         score > STABLE_SCORE],
+        ["TRENDING", "EMERGING", "STABLE"],
+        default="LOW"
     )
 
     # Engagement numeric score
-    df["engagement_score"] = df.apply(
-        lambda r: compute_engagement_score(r["score"], r["num_comments"]),
-        axis=1
-    )
+    df["engagement_score"] = compute_engagement_score(score, comments)
 
     # Filter relevant posts
     df_trend = df[
@@ -67,7 +77,7 @@ def analyze_trends(df):
         (df["trend_keywords"] != "")
     ].copy()
 
-    df_trend.to_csv("output/trend_dataset.csv", index=False)
-    print("Saved trend dataset: output/trend_dataset.csv")
+    path = io_utils.save(df_trend, "trend_dataset")
+    print(f"Writing trend dataset: {path}")
 
     return df_trend
@@ -1,55 +1,102 @@
+import numpy as np
 import pandas as pd
+import matplotlib
+matplotlib.use("Agg")                          # charts are only written to files
 import matplotlib.pyplot as plt
+plt.rcParams["figure.autolayout"] = False      # layout is fitted once, at save time
 import seaborn as sns
+from scipy.stats import gaussian_kde
+import multiprocessing as mp
 import os
+from pathlib import Path
+from collections import Counter
+from modules import io_utils
 
-CHART_DIR = "output/charts/"
+CHART_DIR = Path("output/charts")
+CHART_DIR.mkdir(parents=True, exist_ok=True)
+# matplotlib writes PNGs through Pillow; fast zlib level instead of the default 6
+PNG_OPTIONS = {"compress_level": 1}
+VIZ_CACHE = "_viz_cache"                       # merged + normalized chart data
+VIZ_SOURCES = ("trend_dataset", "reddit_comment_sentiment")
 
+# Only the columns the charts (or the join-key fallbacks) use are read
+TREND_COLUMNS = ["permalink", "url", "link", "post_url", "permalink_url", "title",
+                 "subreddit", "score", "num_comments", "engagement_score", "engagement_label",
+                 "trend_keywords", "song", "artist"]
+SENT_COLUMNS = ["permalink", "url", "title", "avg_neg", "avg_neu", "avg_pos", "avg_compound",
+                "song", "artist"]
 
-def ensure_chart_dir():
-    if not os.path.exists(CHART_DIR):
-        os.makedirs(CHART_DIR)
+# One figure per process, cleared and reused for every chart drawn there
+_FIG = None
+
+
+def _chart_axes(figsize):
+    """Clear the shared figure, resize it and return a fresh axes."""
+    global _FIG
+    if _FIG is None:
+        _FIG = plt.figure(figsize=figsize)
+    _FIG.clear()
+    _FIG.set_size_inches(figsize)
+    return _FIG.add_subplot(111)
+
+
+def _save_chart(filename):
+    _FIG.savefig(CHART_DIR / filename, bbox_inches="tight", pil_kwargs=PNG_OPTIONS)
+    _FIG.clear()
 
 
 def bar_chart(series, title, xlabel, filename, top_n=15):
-    ensure_chart_dir()
-    plt.figure(figsize=(10, 6))
-    series.head(top_n).plot(kind="barh")
-    plt.gca().invert_yaxis()
-    plt.title(title)
-    plt.xlabel(xlabel)
-    plt.tight_layout()
-    plt.savefig(CHART_DIR + filename)
-    plt.close()
+    ax = _chart_axes((10, 6))
+    series.head(top_n).plot(kind="barh", ax=ax)
+    ax.invert_yaxis()
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    _save_chart(filename)
+
+
+def top_counts(series, top_n=15):
+    """The top_n most frequent values (partial sort instead of sorting every count)."""
+    return series.value_counts(sort=False).nlargest(top_n)
+
+
+KDE_MAX_POINTS = 5000                          # KDE cost grows with every sample point
 
 
 def sentiment_distribution(df):
-    ensure_chart_dir()
-    plt.figure(figsize=(8, 5))
-    sns.histplot(df["avg_compound"], bins=20, kde=True)
-    plt.title("Distribution of Comment Sentiment (Compound Score)")
-    plt.xlabel("Sentiment Score")
-    plt.tight_layout()
-    plt.savefig(CHART_DIR + "sentiment_distribution.png")
-    plt.close()
+    ax = _chart_axes((8, 5))
+    values = df["avg_compound"]
+    if len(values) <= KDE_MAX_POINTS:
+        sns.histplot(values, bins=20, kde=True, ax=ax)
+    else:
+        # histogram of all rows; KDE curve fitted on a sample, scaled to counts like histplot's
+        sns.histplot(values, bins=20, alpha=0.5, ax=ax)   # alpha histplot uses with kde=True
+        sample = values.sample(KDE_MAX_POINTS, random_state=0).to_numpy(dtype=np.float64)
+        if sample.std() > 0:
+            grid = np.linspace(values.min(), values.max(), 200)
+            binwidth = (grid[-1] - grid[0]) / 20
+            curve = gaussian_kde(sample)(grid) * len(values) * binwidth
+            ax.plot(grid, curve, color=ax.patches[0].get_facecolor()[:3])
+    ax.set_title("Distribution of Comment Sentiment (Compound Score)")
+    ax.set_xlabel("Sentiment Score")
+    _save_chart("sentiment_distribution.png")
 
 
 def engagement_by_label(df):
-    ensure_chart_dir()
-    plt.figure(figsize=(8, 6))
-    sns.boxplot(x="engagement_label", y="engagement_score", data=df)
-    plt.title("Engagement Score by Trend Category")
-    plt.tight_layout()
-    plt.savefig(CHART_DIR + "engagement_by_label.png")
-    plt.close()
+    ax = _chart_axes((8, 6))
+    sns.boxplot(x="engagement_label", y="engagement_score", data=df, ax=ax)
+    ax.set_title("Engagement Score by Trend Category")
+    _save_chart("engagement_by_label.png")
 
 
 def trend_keyword_frequency(df):
-    ensure_chart_dir()
-
-    # explode the keyword list
-    keywords = df["trend_keywords"].dropna().str.split(", ")
-    keyword_series = keywords.explode().value_counts()
+    # count keywords from one joined string (no per-row lists / explode)
+    keywords = df["trend_keywords"].dropna()
+    keywords = keywords[keywords != ""]        # posts without any trend keyword
+    if keywords.empty:
+        keyword_series = pd.Series(dtype=int)
+    else:
+        counts = Counter(", ".join(keywords.values).split(", ")).most_common(15)
+        keyword_series = pd.Series(dict(counts)).rename_axis("trend_keywords")   # y-axis label
 
     bar_chart(
         keyword_series,
@@ -60,8 +107,14 @@ def trend_keyword_frequency(df):
 
 
 def subreddit_scores(df):
-    ensure_chart_dir()
-    avg_scores = df.groupby("subreddit")["score"].mean().sort_values(ascending=False)
+    # mean per subreddit from two bincounts over the category codes
+    cat = df["subreddit"].astype("category").cat
+    codes = cat.codes.to_numpy()
+    known = codes >= 0                         # code -1 = missing subreddit
+    n = len(cat.categories)
+    sums = np.bincount(codes[known], weights=df["score"].to_numpy(dtype=np.float64)[known], minlength=n)
+    counts = np.bincount(codes[known], minlength=n)
+    avg_scores = pd.Series(sums / np.maximum(counts, 1), index=cat.categories.rename("subreddit")).sort_values(ascending=False)
 
     bar_chart(
         avg_scores,
@@ -72,21 +125,21 @@ def subreddit_scores(df):
 
 
 def correlation_heatmap(df):
-    ensure_chart_dir()
-    numeric_df = df[["score", "num_comments", "engagement_score",
-                     "avg_neg", "avg_neu", "avg_pos", "avg_compound"]]
+    cols = ["score", "num_comments", "engagement_score",
+            "avg_neg", "avg_neu", "avg_pos", "avg_compound"]
+    # float32 straight from the columns: no DataFrame copy, half the bytes scanned
+    arr = df[cols].to_numpy(dtype=np.float32)
+    with np.errstate(divide="ignore", invalid="ignore"):   # constant column -> NaN, as .corr()
+        corr = np.corrcoef(arr, rowvar=False, dtype=np.float32)
 
-    plt.figure(figsize=(10, 8))
-    sns.heatmap(numeric_df.corr(), annot=True, cmap="coolwarm")
-    plt.title("Feature Correlation Heatmap")
-    plt.tight_layout()
-    plt.savefig(CHART_DIR + "correlation_heatmap.png")
-    plt.close()
+    ax = _chart_axes((10, 8))
+    sns.heatmap(pd.DataFrame(corr, index=cols, columns=cols), annot=True, cmap="coolwarm", ax=ax)
+    ax.set_title("Feature Correlation Heatmap")
+    _save_chart("correlation_heatmap.png")
 
 
 def trending_songs(df):
-    ensure_chart_dir()
-    song_counts = df["song"].value_counts()
+    song_counts = top_counts(df["song"])
 
     bar_chart(
         song_counts,
@@ -97,8 +150,7 @@ def trending_songs(df):
 
 
 def trending_artists(df):
-    ensure_chart_dir()
-    artist_counts = df["artist"].value_counts()
+    artist_counts = top_counts(df["artist"])
 
     bar_chart(
         artist_counts,
@@ -108,25 +160,64 @@ def trending_artists(df):
     )
 
 
+SCATTER_MAX_POINTS = 5000                      # beyond this the scatter is saturated anyway
+
+
 def scatter_engagement(df):
-    ensure_chart_dir()
-    plt.figure(figsize=(10, 6))
+    # stratified sample so every engagement label keeps its share of points
+    if len(df) > SCATTER_MAX_POINTS:
+        df = df.groupby("engagement_label", dropna=False).sample(
+            frac=SCATTER_MAX_POINTS / len(df), random_state=0)
+
+    ax = _chart_axes((10, 6))
     sns.scatterplot(
-        x=df["score"],
-        y=df["num_comments"],
-        hue=df["engagement_label"]
+        data=df,
+        x="score",
+        y="num_comments",
+        hue="engagement_label",
+        rasterized=True,
+        ax=ax
     )
-    plt.xlabel("Score (Upvotes)")
-    plt.ylabel("Number of Comments")
-    plt.title("Score vs Comments Colored by Trend Category")
-    plt.tight_layout()
-    plt.savefig(CHART_DIR + "scatter_score_comments.png")
-    plt.close()
-
-def generate_all_visualizations():
+    ax.set_xlabel("Score (Upvotes)")
+    ax.set_ylabel("Number of Comments")
+    ax.set_title("Score vs Comments Colored by Trend Category")
+    _save_chart("scatter_score_comments.png")
+
+
+def _draw_charts(jobs):
+    """Worker: draw (chart function, data) jobs on this process's shared figure."""
+    for f, df in jobs:
+        try:
+            f(df)
+        except Exception as e:
+            print(f"[WARN] {f.__name__} failed: {e}")
+    global _FIG
+    plt.close(_FIG)
+    _FIG = None
+
+
+def _viz_cache_is_fresh():
+    """True if the cached chart data is newer than both source datasets."""
+    cache = io_utils.path_for(VIZ_CACHE)
+    if not os.path.exists(cache):
+        return False
+    for name in VIZ_SOURCES:
+        src = io_utils.resolve(name)
+        io_utils.wait(src)
+        if os.path.exists(src) and os.path.getmtime(src) >= os.path.getmtime(cache):
+            return False
+    return True
+
+
+def prepare_viz_data():
+    """Merge trend + sentiment datasets and normalize the columns the charts use."""
     print("Loading dataset...")
-    trend_df = pd.read_csv("output/trend_dataset.csv")
-    sent_df = pd.read_csv("output/reddit_comment_sentiment.csv")
+    trend_df = io_utils.load("trend_dataset", columns=TREND_COLUMNS)
+    sent_df = io_utils.load("reddit_comment_sentiment", columns=SENT_COLUMNS)
+    if "subreddit" in trend_df.columns:
+        trend_df["subreddit"] = trend_df["subreddit"].astype("category")
+    sent_df = sent_df.astype({c: "float32" for c in ("avg_neg", "avg_neu", "avg_pos", "avg_compound")
+                              if c in sent_df.columns})
 
     # ----------------------------
     # Ensure a common join key exists
@@ -161,52 +252,99 @@ def generate_all_visualizations():
             sent_df = sent_df.reindex(range(n))
             df = pd.concat([trend_df, sent_df.add_suffix("_sent")], axis=1)
     else:
-        # Normal case: merge on permalink
-        df = pd.merge(trend_df, sent_df, on="permalink", how="left")
+        # Normal case: merge on permalink, hashed once per side to int64 keys
+        trend_df["_pk"] = pd.util.hash_array(trend_df["permalink"].to_numpy(dtype=object), encoding="utf8")
+        sent_df["_pk"] = pd.util.hash_array(sent_df["permalink"].to_numpy(dtype=object), encoding="utf8")
+        df = pd.merge(trend_df, sent_df.drop(columns="permalink"), on="_pk", how="left").drop(columns="_pk")
 
     # ----------------------------
     # Normalize important columns so visualizations don't crash
     # ----------------------------
-    # Ensure 'song' exists
+    # Ensure 'song' / 'artist' exist: coalesce the merge-suffixed variants
     if "song" not in df.columns:
-        for candidate in ("song_x", "song_y", "song_sent"):
-            if candidate in df.columns:
-                df["song"] = df[candidate]
-                break
+        cand = df.filter(items=["song_x", "song_y", "song_sent"])
+        if not cand.empty:
+            df["song"] = cand.bfill(axis=1).iloc[:, 0]
         else:
             # fallback to title as a safer alternative
-            df["song"] = df.get("title", "").fillna("unknown")
+            df["song"] = df["title"].fillna("unknown") if "title" in df.columns else "unknown"
 
-    # Ensure 'artist' exists
     if "artist" not in df.columns:
-        for candidate in ("artist_x", "artist_y", "artist_sent"):
-            if candidate in df.columns:
-                df["artist"] = df[candidate]
-                break
-        else:
-            df["artist"] = df.get("artist", "").fillna("")
+        cand = df.filter(items=["artist_x", "artist_y", "artist_sent"])
+        df["artist"] = cand.bfill(axis=1).iloc[:, 0] if not cand.empty else ""
 
     # Ensure numeric columns exist and are numeric (avoid type errors)
-    for col in ["score", "num_comments", "engagement_score", "avg_compound", "avg_pos", "avg_neg", "avg_neu"]:
+    num_cols = ["score", "num_comments", "engagement_score", "avg_compound", "avg_pos", "avg_neg", "avg_neu"]
+    for col in num_cols:
         if col not in df.columns:
             df[col] = 0
-        # try converting to numeric safely
-        df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0)
+    df[num_cols] = df[num_cols].apply(pd.to_numeric, errors="coerce").fillna(0)
 
     # For trend_keywords, ensure it's a string column (no crash when splitting)
     if "trend_keywords" not in df.columns:
         df["trend_keywords"] = ""
 
-    print("Generating visualizations...")
+    # Category dtype for the hue/box grouping; categories keep first-seen order
+    # so seaborn orders boxes and colors exactly as it does for plain strings
+    if "engagement_label" in df.columns:
+        labels = df["engagement_label"]
+        df["engagement_label"] = pd.Categorical(labels, categories=labels.dropna().unique())
+
+    return df
 
-    trending_songs(df)
-    trending_artists(df)
-    subreddit_scores(df)
-    sentiment_distribution(df)
-    engagement_by_label(df)
-    trend_keyword_frequency(df)
-    correlation_heatmap(df)
-    scatter_engagement(df)
+
+def generate_all_visualizations():
+    if _viz_cache_is_fresh():
+        print("Loading cached chart data...")
+        df = io_utils.load(VIZ_CACHE)
+    else:
+        df = prepare_viz_data()
+        io_utils.save(df, VIZ_CACHE)
+
+    print("Generating visualizations...")
+    plt.ioff()
+
+    # Charts are independent: split them over one process per core, each
+    # reusing a single figure. Every chart only gets the columns it draws,
+    # so little is pickled to the workers; they only write their PNGs and
+    # send nothing back.
+    def cols(names):
+        return df.reindex(columns=names)       # a missing column only fails its own chart
+
+    jobs = [
+        (trending_songs, cols(["song"])),
+        (trending_artists, cols(["artist"])),
+        (subreddit_scores, cols(["subreddit", "score"])),
+        (sentiment_distribution, cols(["avg_compound"])),
+        (engagement_by_label, cols(["engagement_label", "engagement_score"])),
+        (trend_keyword_frequency, cols(["trend_keywords"])),
+        (correlation_heatmap, cols(["score", "num_comments", "engagement_score",
+                                    "avg_neg", "avg_neu", "avg_pos", "avg_compound"])),
+        (scatter_engagement, cols(["score", "num_comments", "engagement_label"])),
+    ]
+    n_workers = min(os.cpu_count() or 1, len(jobs))
+    if n_workers < 2:
+        # a worker would first have to re-import matplotlib/seaborn: draw here
+        _draw_charts(jobs)
+        print("Charts saved in output/charts/")
+        return
+
+    # Never plain fork: io_utils' writer threads are alive here, and forking
+    # a threaded (or, on macOS, GUI) process can deadlock. The forkserver
+    # imports this module once, so its children start with it loaded.
+    if "forkserver" in mp.get_all_start_methods():
+        ctx = mp.get_context("forkserver")
+        ctx.set_forkserver_preload(["modules.visualization"])
+    else:
+        ctx = mp.get_context("spawn")
+    groups = [jobs[i::n_workers] for i in range(n_workers)]
+    procs = [ctx.Process(target=_draw_charts, args=(g,)) for g in groups]
+    for p in procs:
+        p.start()
+    for g, p in zip(groups, procs):
+        p.join()
+        if p.exitcode != 0:
+            print(f"[WARN] chart worker for {[f.__name__ for f, _ in g]} failed (exit code {p.exitcode})")
 
     print("Charts saved in output/charts/")
 